@@ -3,11 +3,66 @@ Audio processing module for redacting sensitive content with beep sounds
 """
 
 import ffmpeg
+import functools
+import logging
+import math
 import os
+import shutil
 import tempfile
+import wave
 import numpy as np
 from pathlib import Path
 
+try:
+    from numba import njit
+except ImportError:
+    # Fall back to the NumPy implementation when numba is not available
+    njit = None
+
+logger = logging.getLogger(__name__)
+
+# Beep peak level as a fraction of full scale, matching ffmpeg's lavfi sine source (1/8, about -18 dBFS)
+BEEP_AMPLITUDE = 1 / 8
+
+# Audio codec to encode with, keyed by output file extension
+OUTPUT_CODECS = {
+    'mp3': 'libmp3lame',
+    'wav': 'pcm_s16le',
+    'flac': 'flac',
+    'm4a': 'aac',
+    'aac': 'aac',
+    'ogg': 'libvorbis',
+}
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _beep_kernel(n, sample_rate, frequency, fade):
+        # Sine wave with linear fade in/out, written in a single pass
+        out = np.empty(n, np.float32)
+        w = 2 * np.pi * frequency / sample_rate
+        for i in range(n):
+            g = 1.0
+            if i < fade:
+                g = i / fade
+            elif i >= n - fade:
+                g = (n - 1 - i) / fade
+            out[i] = math.sin(w * i) * g
+        return out
+
+    # Compile (or load from the on-disk cache) now so the first beep doesn't pay for it
+    _beep_kernel(1, 44100, 1000, 0)
+else:
+    _beep_kernel = None
+
+@functools.lru_cache(maxsize=4)
+def _fade_ramp(sample_rate):
+    """10ms linear fade-in ramp for sample_rate, shared read-only between calls"""
+    fade_samples = int(0.01 * sample_rate)
+    ramp = np.arange(fade_samples, dtype=np.float32)
+    ramp /= fade_samples
+    ramp.flags.writeable = False
+    return ramp
+
 def generate_beep_audio(duration, sample_rate=44100, frequency=1000):
     """
     Generate a beep sound of specified duration
@@ -18,23 +73,48 @@ def generate_beep_audio(duration, sample_rate=44100, frequency=1000):
         frequency (int): Beep frequency in Hz
         
     Returns:
-        numpy array: Audio samples
+        numpy array: float32 audio samples in [-1, 1], ready for scaling to
+            int16 without an implicit upcast
     """
-    t = np.linspace(0, duration, int(sample_rate * duration), False)
-    # Generate sine wave for beep
-    beep = np.sin(2 * np.pi * frequency * t)
+    n = int(round(sample_rate * duration))
     # Apply fade in/out to avoid clicks
     fade_samples = int(0.01 * sample_rate)  # 10ms fade
-    if len(beep) > fade_samples * 2:
-        beep[:fade_samples] *= np.linspace(0, 1, fade_samples)
-        beep[-fade_samples:] *= np.linspace(1, 0, fade_samples)
+    if n <= fade_samples * 2:
+        fade_samples = 0
+    
+    if _beep_kernel is not None:
+        return _beep_kernel(n, sample_rate, frequency, fade_samples)
+    
+    # Generate sine wave for beep into a float32 buffer; the phase stays in
+    # float64 so it doesn't drift on long beeps
+    phase = np.arange(n, dtype=np.float64)
+    phase *= 2 * np.pi * frequency / sample_rate
+    beep = np.empty(n, dtype=np.float32)
+    np.sin(phase, out=beep, casting='same_kind')
+    if fade_samples:
+        ramp = _fade_ramp(sample_rate)
+        beep[:fade_samples] *= ramp
+        beep[-fade_samples:] *= ramp[::-1]
     
     return beep
 
+def _write_beep_wav(path, duration, sample_rate=44100):
+    """Write a beep of the given duration to path as a 16-bit mono WAV"""
+    samples = (generate_beep_audio(duration, sample_rate) * (BEEP_AMPLITUDE * 32767)).astype(np.int16)
+    with open(path, 'wb') as f, wave.open(f, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.setnframes(len(samples))
+        w.writeframes(samples.tobytes())
+
 def create_temp_beep_file(duration, temp_dir=None):
     """
     Create a temporary beep audio file
     
+    Durations are keyed to the nearest millisecond and files already present
+    in temp_dir are reused instead of being generated again.
+    
     Args:
         duration (float): Duration in seconds
         temp_dir (str): Temporary directory path
@@ -42,56 +122,159 @@ def create_temp_beep_file(duration, temp_dir=None):
     Returns:
         str: Path to temporary beep file
     """
-    print(f"DEBUG: create_temp_beep_file called with duration={duration}, temp_dir={temp_dir}")
+    logger.debug("create_temp_beep_file called with duration=%s, temp_dir=%s", duration, temp_dir)
     
     if temp_dir is None:
         temp_dir = tempfile.gettempdir()
-        print(f"DEBUG: Using default temp_dir: {temp_dir}")
+        logger.debug("Using default temp_dir: %s", temp_dir)
+    
+    key_ms = int(round(duration * 1000))
+    beep_path = os.path.join(temp_dir, f"beep_{key_ms:06d}ms.wav")
+    logger.debug("Beep file path: %s", beep_path)
     
-    beep_path = os.path.join(temp_dir, f"beep_{duration:.2f}s.wav")
-    print(f"DEBUG: Beep file path: {beep_path}")
+    # Reuse a beep of the same duration generated earlier (44 bytes is an empty WAV)
+    if os.path.exists(beep_path) and os.path.getsize(beep_path) > 44:
+        logger.debug("Reusing existing beep file")
+        return beep_path
     
-    # Generate beep using ffmpeg
-    print("DEBUG: Calling ffmpeg to generate beep...")
+    _write_beep_wav(beep_path, key_ms / 1000)
+    logger.debug("Beep file created successfully: %s", beep_path)
+    
+    return beep_path
+
+def _output_options(output_file):
+    """
+    Pick ffmpeg output options for the extension of output_file
+    
+    Unknown extensions fall back to MP3.
+    """
+    ext = Path(output_file).suffix.lower().lstrip('.')
+    if ext in OUTPUT_CODECS:
+        # Let ffmpeg pick the container from the extension
+        return {'acodec': OUTPUT_CODECS[ext]}
+    return {'acodec': 'libmp3lame', 'format': 'mp3'}
+
+@functools.lru_cache(maxsize=32)
+def _probe_cached(path, mtime, size):
+    """Run ffprobe once per (path, mtime, size) so unchanged files are not re-probed"""
+    return ffmpeg.probe(path)
+
+def _probe(path):
+    return _probe_cached(path, os.path.getmtime(path), os.path.getsize(path))
+
+def _decode_pcm(input_file, audio_info=None):
+    """
+    Decode an audio file to interleaved 16-bit PCM in memory
+    
+    Args:
+        input_file (str): Path to input audio file
+        audio_info (dict): Result of get_audio_info() for input_file, probed if omitted
+        
+    Returns:
+        tuple: (samples as int16 array of shape (frames, channels), sample_rate, channels)
+    """
+    if audio_info is None:
+        audio_info = get_audio_info(input_file)
+        if not audio_info:
+            raise Exception("No audio stream found in input file")
+    
+    sample_rate = audio_info['sample_rate']
+    channels = audio_info['channels']
+    
+    out, _ = (
+        ffmpeg
+        .input(input_file)
+        .output('pipe:', format='s16le', acodec='pcm_s16le', ac=channels, ar=sample_rate)
+        .run(capture_stdout=True, quiet=True)
+    )
+    pcm = np.frombuffer(out, np.int16).reshape(-1, channels)
+    return pcm, sample_rate, channels
+
+def _redact_single_range(input_file, start, end, output_file, audio_info):
+    """
+    Redact one range with a single ffmpeg filter graph (atrim + aevalsrc + concat)
+    
+    Args:
+        input_file (str): Path to input audio file
+        start (float): Start of the redacted range in seconds
+        end (float): End of the redacted range in seconds
+        output_file (str): Path to output audio file
+        audio_info (dict): Result of get_audio_info() for input_file, the
+            duration may be an estimate
+    """
+    start = max(0, start)
+    end = max(start, end)
+    # The probed duration may be an estimate, only use it to avoid beeping past the end
+    beep_duration = max(0, min(end, audio_info['duration']) - start)
+    
+    audio = ffmpeg.input(input_file).audio
+    streams = []
+    if start > 0:
+        streams.append(audio.filter('atrim', end=start))
+    if beep_duration > 0:
+        # Generate the beep in the input's rate and layout so concat neither
+        # resamples nor downmixes; the single expression is repeated in every
+        # channel at BEEP_AMPLITUDE, like the broadcast beep in the PCM path
+        layout = audio_info.get('channel_layout') or f"{audio_info['channels']}c"
+        beep = ffmpeg.input(
+            f"aevalsrc=exprs={BEEP_AMPLITUDE}*sin(2*PI*1000*t)"
+            f":s={audio_info['sample_rate']}:c={layout}:d={beep_duration}",
+            f='lavfi'
+        )
+        # Same 10ms fade in/out as generate_beep_audio
+        if beep_duration > 0.02:
+            beep = (
+                beep
+                .filter('afade', t='in', d=0.01)
+                .filter('afade', t='out', st=beep_duration - 0.01, d=0.01)
+            )
+        streams.append(beep)
+    # Always keep the tail, atrim past the real end just yields nothing
+    streams.append(audio.filter('atrim', start=end).filter('asetpts', 'PTS-STARTPTS'))
+    
+    stream = ffmpeg.concat(*streams, v=0, a=1)
     try:
         (
-            ffmpeg
-            .input(f'sine=frequency=1000:duration={duration}', f='lavfi')
-            .output(beep_path, acodec='pcm_s16le')
+            stream
+            .output(output_file, **_output_options(output_file))
             .overwrite_output()
             .run(quiet=True)
         )
-        print(f"DEBUG: Beep file created successfully: {beep_path}")
-        print(f"DEBUG: Beep file exists: {os.path.exists(beep_path)}")
     except ffmpeg.Error as e:
-        print("DEBUG: STDERR:", e.stderr.decode() if hasattr(e.stderr, "decode") else e.stderr)
+        logger.error("ffmpeg stderr: %s", e.stderr.decode() if hasattr(e.stderr, "decode") else e.stderr)
         raise
-    
-    return beep_path
 
-def redact_audio_segments(input_file, timestamp_ranges, output_file, temp_dir=None):
+def redact_audio_segments(input_file, timestamp_ranges, output_file, temp_dir=None, audio_info=None):
     """
     Redact audio segments by replacing them with beep sounds
     
+    The input is decoded once to PCM, the redacted ranges are replaced with
+    beep samples in memory and the result is encoded in a single ffmpeg pass.
+    A single range is handled entirely inside one ffmpeg filter graph.
+    
     Args:
         input_file (str): Path to input audio file
         timestamp_ranges (list): List of [start, end] timestamp pairs in seconds
         output_file (str): Path to output audio file
-        temp_dir (str): Temporary directory for intermediate files
+        temp_dir (str): Unused, kept for backward compatibility
+        audio_info (dict): Result of get_audio_info() for input_file, skips probing when given
         
     Returns:
         bool: True if successful, False otherwise
     """
     try:
-        print(f"DEBUG: redact_audio_segments called with:")
-        print(f"DEBUG:   input_file: {input_file}")
-        print(f"DEBUG:   output_file: {output_file}")
-        print(f"DEBUG:   timestamp_ranges: {timestamp_ranges}")
-        print(f"DEBUG:   temp_dir: {temp_dir}")
+        logger.debug(
+            "redact_audio_segments called with input_file=%s, output_file=%s, timestamp_ranges=%s",
+            input_file, output_file, timestamp_ranges
+        )
         
         if not timestamp_ranges:
-            print("DEBUG: No timestamp ranges, copying file directly")
+            logger.debug("No timestamp ranges, copying file directly")
             # No redaction needed, just copy the file
+            if Path(input_file).suffix.lower() == Path(output_file).suffix.lower():
+                # Same container, copy the bytes instead of re-encoding
+                shutil.copyfile(input_file, output_file)
+                return True
             (
                 ffmpeg
                 .input(input_file)
@@ -101,119 +284,92 @@ def redact_audio_segments(input_file, timestamp_ranges, output_file, temp_dir=No
             )
             return True
         
-        if temp_dir is None:
-            temp_dir = tempfile.mkdtemp()
-        print(f"DEBUG: Using temp_dir: {temp_dir}")
-        
-        # Get audio info
-        print("DEBUG: Probing input file with ffmpeg...")
-        probe = ffmpeg.probe(input_file)
-        print("DEBUG: ffmpeg.probe() completed successfully")
-        audio_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'audio'), None)
-        if not audio_stream:
-            raise Exception("No audio stream found in input file")
+        if len(timestamp_ranges) == 1:
+            # A single range needs no splicing in Python, let one ffmpeg run do it
+            if audio_info is None:
+                audio_info = get_audio_info(input_file)
+            start, end = timestamp_ranges[0]
+            # Without usable probed info, fall through to the PCM path,
+            # which measures the length from the decoded samples
+            if (
+                audio_info
+                and audio_info['sample_rate'] > 0
+                and audio_info['channels'] > 0
+                and start < audio_info['duration']
+            ):
+                logger.debug("Single range, redacting [%s, %s] in one ffmpeg pass", start, end)
+                _redact_single_range(input_file, start, end, output_file, audio_info)
+                return True
         
-        duration = float(audio_stream['duration'])
-        print(f"DEBUG: Audio duration: {duration}s")
+        # Decode the whole input once
+        logger.debug("Decoding input file to PCM...")
+        pcm, sample_rate, channels = _decode_pcm(input_file, audio_info)
+        total_samples = len(pcm)
+        duration = total_samples / sample_rate
+        logger.debug("Audio duration: %ss (%s Hz, %s channels)", duration, sample_rate, channels)
         
-        # Sort timestamp ranges by start time
-        sorted_ranges = sorted(timestamp_ranges, key=lambda x: x[0])
-        print(f"DEBUG: Sorted ranges: {sorted_ranges}")
+        # Sort timestamp ranges by start time and merge overlapping or adjacent ones
+        merged_ranges = []
+        for start, end in sorted(timestamp_ranges, key=lambda x: x[0]):
+            if merged_ranges and start - merged_ranges[-1][1] < 1 / sample_rate:
+                merged_ranges[-1][1] = max(merged_ranges[-1][1], end)
+            else:
+                merged_ranges.append([start, end])
+        logger.debug("Merged ranges: %s", merged_ranges)
         
-        # Create list of segments (either original audio or beep)
-        segments = []
-        current_time = 0.0
+        # Build list of parts (views into the original audio or beep samples)
+        parts = []
+        current_sample = 0
         
-        for i, (start, end) in enumerate(sorted_ranges):
-            print(f"DEBUG: Processing range {i+1}/{len(sorted_ranges)}: [{start}, {end}]")
-            
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for i, (start, end) in enumerate(merged_ranges):
             # Ensure valid range
-            start = max(0, min(start, duration))
-            end = max(start, min(end, duration))
-            print(f"DEBUG: Adjusted range: [{start}, {end}]")
+            start_sample = max(current_sample, min(int(start * sample_rate), total_samples))
+            end_sample = max(start_sample, min(int(end * sample_rate), total_samples))
+            if debug:
+                logger.debug(
+                    "Range %d/%d: [%s, %s] adjusted to [%s, %s]",
+                    i + 1, len(merged_ranges), start, end,
+                    start_sample / sample_rate, end_sample / sample_rate
+                )
             
             # Add original audio before redaction
-            if current_time < start:
-                original_segment = os.path.join(temp_dir, f"original_{current_time:.2f}_{start:.2f}.wav")
-                print(f"DEBUG: Creating original segment: {original_segment}")
-                print(f"DEBUG: Extracting from {current_time}s to {start}s (duration: {start-current_time}s)")
-                (
-                    ffmpeg
-                    .input(input_file, ss=current_time, t=start-current_time)
-                    .output(original_segment, acodec='pcm_s16le')
-                    .overwrite_output()
-                    .run(quiet=True)
-                )
-                print(f"DEBUG: Original segment created successfully")
-                segments.append(original_segment)
+            if current_sample < start_sample:
+                parts.append(pcm[current_sample:start_sample])
             
             # Add beep for redacted section
-            if end > start:
-                beep_duration = end - start
-                print(f"DEBUG: Creating beep file for duration: {beep_duration}s")
-                beep_file = create_temp_beep_file(beep_duration, temp_dir)
-                print(f"DEBUG: Beep file created: {beep_file}")
-                segments.append(beep_file)
+            if end_sample > start_sample:
+                beep_samples = end_sample - start_sample
+                beep = generate_beep_audio(beep_samples / sample_rate, sample_rate)
+                beep = (beep * (BEEP_AMPLITUDE * 32767)).astype(np.int16)
+                parts.append(np.broadcast_to(beep[:, None], (beep_samples, channels)))
             
-            current_time = end
+            current_sample = end_sample
         
         # Add remaining original audio after last redaction
-        if current_time < duration:
-            final_segment = os.path.join(temp_dir, f"final_{current_time:.2f}_{duration:.2f}.wav")
-            (
-                ffmpeg
-                .input(input_file, ss=current_time)
-                .output(final_segment, acodec='pcm_s16le')
-                .overwrite_output()
-                .run(quiet=True)
-            )
-            segments.append(final_segment)
+        if current_sample < total_samples:
+            parts.append(pcm[current_sample:])
         
-        # Concatenate all segments
-        if len(segments) == 1:
-            # Only one segment, just copy it
+        buf = np.concatenate(parts)
+        
+        # Encode the spliced buffer in a single pass, streaming it to ffmpeg's
+        # stdin through a byte view instead of copying it with tobytes()
+        try:
             (
                 ffmpeg
-                .input(segments[0])
-                .output(output_file)
+                .input('pipe:', format='s16le', ar=sample_rate, ac=channels)
+                .output(output_file, **_output_options(output_file))
                 .overwrite_output()
-                .run(quiet=True)
+                .run(input=memoryview(buf).cast('B'), quiet=True)
             )
-        else:
-            # Concatenate using ffmpeg concat filter (safe for mixed WAV segments)
-            input_streams = [ffmpeg.input(s) for s in segments]
-
-            try:
-                (
-                    ffmpeg
-                    .concat(*input_streams, v=0, a=1)
-                    .output(output_file, acodec='libmp3lame', format='mp3')
-                    .overwrite_output()
-                    .run(quiet=True)
-                )
-            except ffmpeg.Error as e:
-                print("DEBUG: STDERR:", e.stderr.decode() if hasattr(e.stderr, "decode") else e.stderr)
-                raise
-
+        except ffmpeg.Error as e:
+            logger.error("ffmpeg stderr: %s", e.stderr.decode() if hasattr(e.stderr, "decode") else e.stderr)
+            raise
         
-        # Clean up temporary files
-        try:
-            for segment in segments:
-                if os.path.exists(segment):
-                    os.remove(segment)
-        except Exception as e:
-            print(f"DEBUG: Cleanup warning: {e}")
-            pass  # Still ignore cleanup errors
-
         return True
-
         
     except Exception as e:
-        print(f"DEBUG: Exception in redact_audio_segments: {e}")
-        print(f"DEBUG: Exception type: {type(e)}")
-        import traceback
-        print(f"DEBUG: Traceback: {traceback.format_exc()}")
-        print(f"Error redacting audio: {e}")
+        logger.exception("Error redacting audio: %s", e)
         return False
 
 def get_audio_info(audio_file):
@@ -227,7 +383,7 @@ def get_audio_info(audio_file):
         dict: Audio information (duration, sample_rate, format, etc.)
     """
     try:
-        probe = ffmpeg.probe(audio_file)
+        probe = _probe(audio_file)
         audio_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'audio'), None)
         
         if not audio_stream:
@@ -237,12 +393,13 @@ def get_audio_info(audio_file):
             'duration': float(audio_stream.get('duration', 0)),
             'sample_rate': int(audio_stream.get('sample_rate', 0)),
             'channels': int(audio_stream.get('channels', 0)),
+            'channel_layout': audio_stream.get('channel_layout'),
             'format': audio_stream.get('codec_name', 'unknown'),
             'bit_rate': int(audio_stream.get('bit_rate', 0)) if audio_stream.get('bit_rate') else None
         }
         
     except Exception as e:
-        print(f"Error getting audio info: {e}")
+        logger.error("Error getting audio info: %s", e)
         return None
 
 def convert_audio_format(input_file, output_file, target_format='wav'):
@@ -268,5 +425,5 @@ def convert_audio_format(input_file, output_file, target_format='wav'):
         return True
         
     except Exception as e:
-        print(f"Error converting audio format: {e}")
+        logger.error("Error converting audio format: %s", e)
         return False
\ No newline at end of file
@@ -301,7 +301,8 @@ def main():
                         success = redact_audio_segments(
                             temp_input_path, 
                             st.session_state.sensitive_timestamps, 
-                            temp_output_path
+                            temp_output_path,
+                            audio_info=st.session_state.audio_info
                         )
                         print(f"DEBUG: Redaction success: {success}")
                         